@@ -21,10 +21,19 @@
 from common.srdhelper import bitpack_lsb
 
 def disabled_enabled(v):
-    return ['Disabled', 'Enabled'][v]
+    return ('Disabled', 'Enabled',)[v]
+
+output_powers = tuple('{:+d}dBm'.format(p) for p in (-4, -1, 2, 5))
 
 def output_power(v):
-    return '{:+d}dBm'.format([-4, -1, 2, 5][v])
+    return output_powers[v]
+
+charge_pump_currents = tuple('{curr:0.2f}mA @ 5.1kΩ'.format(curr = c) for c in (
+    0.31, 0.63, 0.94, 1.25, 1.56, 1.88, 2.19, 2.50,
+    2.81, 3.13, 3.44, 3.75, 4.06, 4.38, 4.69, 5.00,
+))
+
+rf_dividers = tuple('÷{:d}'.format(2 ** v) for v in range(8))
 
 # Notes on the implementation:
 # - A register's description is an iterable of tuples which contain:
@@ -59,33 +68,30 @@ def output_power(v):
         ( 7,  1, 'LDP', lambda v: ('10ns', '6ns',)[v]),
         ( 8,  1, 'LDF', lambda v: ('FRAC-N', 'INT-N',)[v]),
         ( 9,  4, 'Charge Pump Current Setting',
-            lambda v: '{curr:0.2f}mA @ 5.1kΩ'.format(curr = (
-                0.31, 0.63, 0.94, 1.25, 1.56, 1.88, 2.19, 2.50,
-                2.81, 3.13, 3.44, 3.75, 4.06, 4.38, 4.69, 5.00,
-            )[v])),
+            lambda v: charge_pump_currents[v]),
         (13,  1, 'Double Buffer', disabled_enabled),
         (14, 10, 'R Counter'),
         (24,  1, 'RDIV2', disabled_enabled),
         (25,  1, 'Reference Doubler', disabled_enabled),
         (26,  3, 'MUXOUT',
-            lambda v: '{text}'.format(text = (
+            lambda v: (
                 'Three-State Output', 'DVdd', 'DGND',
                 'R Counter Output', 'N Divider Output',
                 'Analog Lock Detect', 'Digital Lock Detect',
                 'Reserved',
-            )[v])),
+            )[v]),
         (29,  2, 'Low Noise and Low Spur Modes',
-            lambda v: '{text}'.format(text = (
+            lambda v: (
                 'Low Noise Mode', 'Reserved', 'Reserved', 'Low Spur Mode',
-            )[v])),
+            )[v]),
     ),
     3: (
         ( 3, 12, 'Clock Divider'),
         (15,  2, 'Clock Divider Mode',
-            lambda v: '{text}'.format(text = (
+            lambda v: (
                 'Clock Divider Off', 'Fast Lock Enable',
                 'Resync Enable', 'Reserved',
-            )[v])),
+            )[v]),
         (18,  1, 'CSR Enable', disabled_enabled),
         (21,  1, 'Charge Cancellation', disabled_enabled),
         (22,  1, 'ABP', lambda v: ('6ns (FRAC-N)', '3ns (INT-N)',)[v]),
@@ -100,19 +106,43 @@ def output_power(v):
         ( 9,  1, 'AUX Output Enable', disabled_enabled),
         (10,  1, 'MTLD', disabled_enabled),
         (11,  1, 'VCO Power-Down',
-            lambda v: 'VCO Powered {ud}'.format(ud = 'Down' if v else 'Up')),
+            lambda v: ('VCO Powered Up', 'VCO Powered Down',)[v]),
         (12,  8, 'Band Select Clock Divider'),
-        (20,  3, 'RF Divider Select', lambda v: '÷{:d}'.format(2 ** v)),
+        (20,  3, 'RF Divider Select', lambda v: rf_dividers[v]),
         (23,  1, 'Feedback Select', lambda v: ('Divided', 'Fundamental',)[v]),
     ),
     5: (
         (22,  2, 'LD Pin Mode',
-            lambda v: '{text}'.format(text = (
+            lambda v: (
                 'Low', 'Digital Lock Detect', 'Low', 'High',
-            )[v])),
+            )[v]),
     ),
 }
 
+def prepare_fields(field_descs):
+    '''Expand a register's field descriptions to uniform tuples.'''
+    # Resolve optional parsers and checkers, the bit field's end
+    # position and its value mask, ahead of time. Keeps the per-word
+    # decoding loop simple.
+    fields = []
+    for field_desc in field_descs:
+        if len(field_desc) not in (3, 4, 5):
+            # Unsupported regs{} syntax, programmer's error.
+            break
+        start, count, name, parser, checker = (field_desc + (None, None,))[:5]
+        mask = (1 << count) - 1
+        fields.append((start, start + count, mask, name, parser, checker))
+    return tuple(fields)
+
+reg_fields = {addr: prepare_fields(descs) for addr, descs in regs.items()}
+
+# Annotation texts for all 3bit register addresses.
+reg_texts = tuple([
+    'Register: {addr}'.format(addr = addr),
+    'Reg: {addr}'.format(addr = addr),
+    '[{addr}]'.format(addr = addr),
+] for addr in range(8))
+
 ( ANN_REG, ANN_WARN, ) = range(2)
 
 class Decoder(srd.Decoder):
@@ -140,6 +170,7 @@ def __init__(self):
 
     def reset(self):
         self.bits = []
+        self.word = 0
 
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
@@ -147,31 +178,12 @@ def start(self):
     def putg(self, ss, es, cls, data):
         self.put(ss, es, self.out_ann, [ cls, data, ])
 
-    def decode_bits(self, offset, width):
+    def decode_bits(self, start, end):
         '''Extract a bit field. Expects LSB input data.'''
-        bits = self.bits[offset:][:width]
-        ss, es = bits[-1][1], bits[0][2]
-        value = bitpack_lsb(bits, 0)
+        value = (self.word >> start) & ((1 << (end - start)) - 1)
+        ss, es = self.bits[end - 1][1], self.bits[start][2]
         return ( value, ( ss, es, ))
 
-    def decode_field(self, name, offset, width, parser = None, checker = None):
-        '''Interpret a bit field. Emits an annotation.'''
-        # Get the register field's content and position.
-        val, ( ss, es, ) = self.decode_bits(offset, width)
-        # Have the field's content formatted, emit an annotation.
-        formatted = parser(val) if parser else '{}'.format(val)
-        if formatted is not None:
-            text = ['{name}: {val}'.format(name = name, val = formatted)]
-        else:
-            text = ['{name}'.format(name = name)]
-        if text:
-            self.putg(ss, es, ANN_REG, text)
-        # Have the field's content checked, emit an optional warning.
-        warn = checker(val) if checker else None
-        if warn:
-            text = ['{}'.format(warn)]
-            self.putg(ss, es, ANN_WARN, text)
-
     def decode_word(self, ss, es, bits):
         '''Interpret a 32bit word after accumulation completes.'''
         # SPI transfer content must be exactly one 32bit word.
@@ -184,35 +196,36 @@ def decode_word(self, ss, es, bits):
             ]
             self.putg(ss, es, ANN_WARN, text)
             return
-        # Holding bits in LSB order during interpretation simplifies
-        # bit field extraction. And annotation emitting routines expect
-        # this reverse order of bits' timestamps.
-        self.bits.reverse()
+        # Bits were accumulated in LSB order, which simplifies bit field
+        # extraction. Annotation emitting routines expect this reverse
+        # order of bits' timestamps, too. Pack the bits' values once,
+        # fields get extracted from the integer value, their timestamps
+        # are taken from the list of bits.
+        self.word = bitpack_lsb(self.bits, 0)
         # Determine which register was accessed.
         reg_addr, ( reg_ss, reg_es, ) = self.decode_bits(0, 3)
-        text = [
-            'Register: {addr}'.format(addr = reg_addr),
-            'Reg: {addr}'.format(addr = reg_addr),
-            '[{addr}]'.format(addr = reg_addr),
-        ]
-        self.putg(reg_ss, reg_es, ANN_REG, text)
+        self.putg(reg_ss, reg_es, ANN_REG, reg_texts[reg_addr])
         # Interpret the register's content (when parsers are available).
-        field_descs = regs.get(reg_addr, None)
-        if not field_descs:
+        # Each bit field emits an annotation, and optionally a warning.
+        fields = reg_fields.get(reg_addr, None)
+        if not fields:
             return
-        for field_desc in field_descs:
-            parser = None
-            checker = None
-            if len(field_desc) == 3:
-                start, count, name, = field_desc
-            elif len(field_desc) == 4:
-                start, count, name, parser = field_desc
-            elif len(field_desc) == 5:
-                start, count, name, parser, checker = field_desc
+        word, bits, putg = self.word, self.bits, self.putg
+        for start, end, mask, name, parser, checker in fields:
+            # Get the register field's content and position.
+            val = (word >> start) & mask
+            ss, es = bits[end - 1][1], bits[start][2]
+            # Have the field's content formatted, emit an annotation.
+            formatted = parser(val) if parser else '{}'.format(val)
+            if formatted is not None:
+                text = ['{name}: {val}'.format(name = name, val = formatted)]
             else:
-                # Unsupported regs{} syntax, programmer's error.
-                return
-            self.decode_field(name, start, count, parser, checker)
+                text = ['{name}'.format(name = name)]
+            putg(ss, es, ANN_REG, text)
+            # Have the field's content checked, emit an optional warning.
+            warn = checker(val) if checker else None
+            if warn:
+                putg(ss, es, ANN_WARN, ['{}'.format(warn)])
 
     def decode(self, ss, es, data):
         ptype, _, _ = data
@@ -224,7 +237,8 @@ def decode(self, ss, es, data):
 
         if ptype == 'BITS':
             _, mosi_bits, miso_bits = data
-            # Accumulate bits in MSB order as they are seen in SPI frames.
-            msb_bits = mosi_bits.copy()
-            msb_bits.reverse()
-            self.bits.extend(msb_bits)
+            # Accumulate bits in LSB order. SPI frames hold an LSB first
+            # list of bits per data word, and later words carry lower
+            # bits of the register value. Prepending avoids copying and
+            # reversing lists on the way.
+            self.bits[:0] = mosi_bits
@@ -47,7 +47,7 @@ def __init__(self):
 
     def reset(self):
         self.buf = []
-        self.syncbuf = []
+        self.syncword = 0
         self.prevsample = 0
         self.stream = 0
         self.ss_stream = None
@@ -117,13 +117,18 @@ def decode(self, ss, es, data):
             self.buf = []
             return
 
-        # Keep separate buffer for detection of sync packets.
+        # Keep the last four bytes in a shift register for detection of
+        # sync packets. Values which exceed 8 bits cannot be part of a
+        # sync packet, and restart the detection.
         # Sync packets override everything else, so that we can regain sync
         # even if some packets are corrupted.
-        self.syncbuf = self.syncbuf[-3:] + [pdata[0]]
-        if self.syncbuf == [0xFF, 0xFF, 0xFF, 0x7F]:
+        if pdata[0] <= 0xFF:
+            self.syncword = ((self.syncword << 8) | pdata[0]) & 0xFFFFFFFF
+        else:
+            self.syncword = 0
+        if self.syncword == 0xFFFFFF7F:
             self.buf = []
-            self.syncbuf = []
+            self.syncword = 0
             return
 
         if len(self.buf) == 16:
@@ -92,6 +92,72 @@
     0xff: 'CRC / communications error',
 }
 
+# Annotations and texts for table lookups, created once. The srd module
+# copies annotation texts when they get emitted, lists can be shared.
+WORD_ADDR_ANNS = {k: [0, ['Word addr: %s' % v]] for k, v in WORD_ADDR.items()}
+COUNT_ANNS = tuple([1, ['Count: %d' % v]] for v in range(256))
+OPCODE_ANNS = {k: [2, ['Opcode: %s' % v]] for k, v in OPCODES.items()}
+ZONE_TEXTS = {k: 'Zone: %s' % v for k, v in ZONES.items()}
+STATUS_ANNS = {k: [7, ['Status: %s' % v]] for k, v in STATUS.items()}
+PARAM2_NONE_ANN = [4, ['-']]
+
+STATE_IDLE, STATE_GET_SLAVE_ADDR, STATE_READ_REGS, STATE_WRITE_REGS = range(4)
+
+def param1_mode(v):
+    return 'Mode: %02X' % v
+
+# Opcode groups which share the layout of a command's fields.
+MODE_OPCODES = frozenset((
+    OPCODE_CHECK_MAC, OPCODE_COUNTER, OPCODE_DEV_REV, OPCODE_ECDH,
+    OPCODE_GEN_KEY, OPCODE_HMAC, OPCODE_MAC, OPCODE_NONCE, OPCODE_RANDOM,
+    OPCODE_SHA, OPCODE_SIGN, OPCODE_VERIFY,
+))
+OTHERDATA_OPCODES = frozenset((OPCODE_GEN_DIG, OPCODE_GEN_KEY))
+
+# Interpretation of a command's Param1 byte, depending on its opcode.
+PARAM1 = dict.fromkeys(MODE_OPCODES, param1_mode)
+PARAM1.update({
+    OPCODE_DERIVE_KEY:  lambda v: 'Random: %s' % v,
+    OPCODE_PRIVWRITE:   lambda v: 'Encrypted: %s' % ('Yes' if v & 0x40 else 'No'),
+    OPCODE_GEN_DIG:     lambda v: ZONE_TEXTS[v],
+    OPCODE_LOCK:        lambda v: 'Zone: %s, Summary: %s' % (
+                            'DATA/OTP' if v else 'CONFIG',
+                            'Ignored' if v & 0x80 else 'Used'),
+    OPCODE_PAUSE:       lambda v: 'Selector: %02X' % v,
+    OPCODE_READ:        lambda v: 'Zone: %s, Length: %s' % (ZONES[v & 0x03],
+                            '32 bytes' if v & 0x90 else '4 bytes'),
+    OPCODE_WRITE:       lambda v: 'Zone: %s, Encrypted: %s, Length: %s' % (ZONES[v & 0x03],
+                            'Yes' if v & 0x40 else 'No', '32 bytes' if v & 0x90 else '4 bytes'),
+})
+
+# Name of a command's Param2 word, depending on its opcode.
+PARAM2 = {
+    OPCODE_DERIVE_KEY:  'TargetKey',
+    OPCODE_COUNTER:     'KeyID',
+    OPCODE_ECDH:        'KeyID',
+    OPCODE_GEN_KEY:     'KeyID',
+    OPCODE_PRIVWRITE:   'KeyID',
+    OPCODE_SIGN:        'KeyID',
+    OPCODE_VERIFY:      'KeyID',
+    OPCODE_NONCE:       'Zero',
+    OPCODE_PAUSE:       'Zero',
+    OPCODE_RANDOM:      'Zero',
+    OPCODE_HMAC:        'SlotID',
+    OPCODE_MAC:         'SlotID',
+    OPCODE_CHECK_MAC:   'SlotID',
+    OPCODE_GEN_DIG:     'SlotID',
+    OPCODE_LOCK:        'Summary',
+    OPCODE_READ:        'Address',
+    OPCODE_WRITE:       'Address',
+}
+
+HEX_BYTES = tuple('%02x' % v for v in range(256))
+HEX_BYTES_UPPER = tuple('%02X' % v for v in range(256))
+
+def hexdump(s):
+    '''Format the data values of a list of (ss, es, byte) items as hex text.'''
+    return ' '.join([HEX_BYTES[i[2]] for i in s])
+
 class Decoder(srd.Decoder):
     api_version = 3
     id = 'atsha204a'
@@ -120,10 +186,17 @@ class Decoder(srd.Decoder):
     )
 
     def __init__(self):
+        # Indexed by STATE_* values.
+        self.state_handlers = (
+            self.handle_idle,
+            self.handle_get_slave_addr,
+            self.handle_read_regs,
+            self.handle_write_regs,
+        )
         self.reset()
 
     def reset(self):
-        self.state = 'IDLE'
+        self.state = STATE_IDLE
         self.waddr = self.opcode = -1
         self.ss_block = self.es_block = 0
         self.bytes = []
@@ -133,17 +206,18 @@ def start(self):
 
     def output_tx_bytes(self):
         b = self.bytes
-        if len(b) < 1: # Ignore wakeup.
+        count = len(b) - 1
+        if count < 0: # Ignore wakeup.
             return
         self.waddr = b[0][2]
-        self.put_waddr(b[0])
+        self.putx(b[0], WORD_ADDR_ANNS[self.waddr])
         if self.waddr == WORD_ADDR_COMMAND:
-            count = b[1][2]
-            self.put_count(b[1])
-            if len(b) - 1 != count:
+            want = b[1][2]
+            self.putx(b[1], COUNT_ANNS[want])
+            if count != want:
                 self.put_warning(b[0][0], b[-1][1],
-                    'Invalid frame length: Got {}, expecting {} '.format(
-                    len(b) - 1, count))
+                    'Invalid frame length: Got %d, expecting %d ' % (
+                    count, want))
                 return
             self.opcode = b[2][2]
             self.put_opcode(b[2])
@@ -155,7 +229,7 @@ def output_tx_bytes(self):
     def output_rx_bytes(self):
         b = self.bytes
         count = b[0][2]
-        self.put_count(b[0])
+        self.putx(b[0], COUNT_ANNS[count])
         if self.waddr == WORD_ADDR_RESET:
             self.put_data([b[1]])
             self.put_crc([b[2], b[3]])
@@ -178,146 +252,117 @@ def puty(self, s, data):
     def putz(self, ss, es, data):
         self.put(ss, es, self.out_ann, data)
 
-    def put_waddr(self, s):
-        self.putx(s, [0, ['Word addr: %s' % WORD_ADDR[s[2]]]])
-
-    def put_count(self, s):
-        self.putx(s, [1, ['Count: %s' % s[2]]])
-
     def put_opcode(self, s):
-        self.putx(s, [2, ['Opcode: %s' % OPCODES[s[2]]]])
+        self.putx(s, OPCODE_ANNS[s[2]])
 
     def put_param1(self, s):
-        op = self.opcode
-        if op in (OPCODE_CHECK_MAC, OPCODE_COUNTER, OPCODE_DEV_REV,     \
-                  OPCODE_ECDH, OPCODE_GEN_KEY, OPCODE_HMAC, OPCODE_MAC, \
-                  OPCODE_NONCE, OPCODE_RANDOM, OPCODE_SHA, OPCODE_SIGN, \
-                  OPCODE_VERIFY):
-            self.putx(s, [3, ['Mode: %02X' % s[2]]])
-        elif op == OPCODE_DERIVE_KEY:
-            self.putx(s, [3, ['Random: %s' % s[2]]])
-        elif op == OPCODE_PRIVWRITE:
-            self.putx(s, [3, ['Encrypted: {}'.format('Yes' if s[2] & 0x40 else 'No')]])
-        elif op == OPCODE_GEN_DIG:
-            self.putx(s, [3, ['Zone: %s' % ZONES[s[2]]]])
-        elif op == OPCODE_LOCK:
-            self.putx(s, [3, ['Zone: {}, Summary: {}'.format(
-                'DATA/OTP' if s[2] else 'CONFIG',
-                'Ignored' if s[2] & 0x80 else 'Used')]])
-        elif op == OPCODE_PAUSE:
-            self.putx(s, [3, ['Selector: %02X' % s[2]]])
-        elif op == OPCODE_READ:
-            self.putx(s, [3, ['Zone: {}, Length: {}'.format(ZONES[s[2] & 0x03],
-                '32 bytes' if s[2] & 0x90 else '4 bytes')]])
-        elif op == OPCODE_WRITE:
-            self.putx(s, [3, ['Zone: {}, Encrypted: {}, Length: {}'.format(ZONES[s[2] & 0x03],
-                'Yes' if s[2] & 0x40 else 'No', '32 bytes' if s[2] & 0x90 else '4 bytes')]])
+        parser = PARAM1.get(self.opcode, None)
+        if parser:
+            self.putx(s, [3, [parser(s[2])]])
         else:
             self.putx(s, [3, ['Param1: %02X' % s[2]]])
 
     def put_param2(self, s):
         op = self.opcode
-        if op == OPCODE_DERIVE_KEY:
-            self.puty(s, [4, ['TargetKey: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
-        elif op in (OPCODE_COUNTER, OPCODE_ECDH, OPCODE_GEN_KEY, OPCODE_PRIVWRITE, \
-                    OPCODE_SIGN, OPCODE_VERIFY):
-            self.puty(s, [4, ['KeyID: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
-        elif op in (OPCODE_NONCE, OPCODE_PAUSE, OPCODE_RANDOM):
-            self.puty(s, [4, ['Zero: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
-        elif op in (OPCODE_HMAC, OPCODE_MAC, OPCODE_CHECK_MAC, OPCODE_GEN_DIG):
-            self.puty(s, [4, ['SlotID: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
-        elif op == OPCODE_LOCK:
-            self.puty(s, [4, ['Summary: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
-        elif op in (OPCODE_READ, OPCODE_WRITE):
-            self.puty(s, [4, ['Address: {:02x} {:02x}'.format(s[1][2], s[0][2])]])
+        name = PARAM2.get(op, None)
+        if name:
+            self.puty(s, [4, ['%s: %s %s' % (name, HEX_BYTES[s[1][2]], HEX_BYTES[s[0][2]])]])
         elif op == OPCODE_UPDATE_EXTRA:
-            self.puty(s, [4, ['NewValue: {:02x}'.format(s[0][2])]])
+            self.puty(s, [4, ['NewValue: %s' % HEX_BYTES[s[0][2]]]])
         else:
-            self.puty(s, [4, ['-']])
+            self.puty(s, PARAM2_NONE_ANN)
 
     def put_data(self, s):
         if len(s) == 0:
             return
         op = self.opcode
+        put, out_ann = self.put, self.out_ann
         if op == OPCODE_CHECK_MAC:
-            self.putz(s[0][0], s[31][1], [5, ['ClientChal: %s' % ' '.join(format(i[2], '02x') for i in s[0:32])]])
-            self.putz(s[32][0], s[63][1], [5, ['ClientResp: %s' % ' '.join(format(i[2], '02x') for i in s[32:64])]])
-            self.putz(s[64][0], s[76][1], [5, ['OtherData: %s' % ' '.join(format(i[2], '02x') for i in s[64:77])]])
+            put(s[0][0], s[31][1], out_ann, [5, ['ClientChal: %s' % hexdump(s[0:32])]])
+            put(s[32][0], s[63][1], out_ann, [5, ['ClientResp: %s' % hexdump(s[32:64])]])
+            put(s[64][0], s[76][1], out_ann, [5, ['OtherData: %s' % hexdump(s[64:77])]])
         elif op == OPCODE_DERIVE_KEY:
-            self.putz(s[0][0], s[31][1], [5, ['MAC: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+            put(s[0][0], s[31][1], out_ann, [5, ['MAC: %s' % hexdump(s)]])
         elif op == OPCODE_ECDH:
-            self.putz(s[0][0], s[31][1], [5, ['Pub X: %s' % ' '.join(format(i[2], '02x') for i in s[0:32])]])
-            self.putz(s[32][0], s[63][1], [5, ['Pub Y: %s' % ' '.join(format(i[2], '02x') for i in s[32:64])]])
-        elif op in (OPCODE_GEN_DIG, OPCODE_GEN_KEY):
-            self.putz(s[0][0], s[3][1], [5, ['OtherData: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+            put(s[0][0], s[31][1], out_ann, [5, ['Pub X: %s' % hexdump(s[0:32])]])
+            put(s[32][0], s[63][1], out_ann, [5, ['Pub Y: %s' % hexdump(s[32:64])]])
+        elif op in OTHERDATA_OPCODES:
+            put(s[0][0], s[3][1], out_ann, [5, ['OtherData: %s' % hexdump(s)]])
         elif op == OPCODE_MAC:
-            self.putz(s[0][0], s[31][1], [5, ['Challenge: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+            put(s[0][0], s[31][1], out_ann, [5, ['Challenge: %s' % hexdump(s)]])
         elif op == OPCODE_PRIVWRITE:
             if len(s) > 36: # Key + MAC.
-                self.putz(s[0][0], s[-35][1], [5, ['Value: %s' % ' '.join(format(i[2], '02x') for i in s)]])
-                self.putz(s[-32][0], s[-1][1], [5, ['MAC: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+                text = hexdump(s)
+                put(s[0][0], s[-35][1], out_ann, [5, ['Value: %s' % text]])
+                put(s[-32][0], s[-1][1], out_ann, [5, ['MAC: %s' % text]])
             else: # Just value.
-                self.putz(s[0][0], s[-1][1], [5, ['Value: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+                put(s[0][0], s[-1][1], out_ann, [5, ['Value: %s' % hexdump(s)]])
         elif op == OPCODE_VERIFY:
             if len(s) >= 64: # ECDSA components (always present)
-                self.putz(s[0][0], s[31][1], [5, ['ECDSA R: %s' % ' '.join(format(i[2], '02x') for i in s[0:32])]])
-                self.putz(s[32][0], s[63][1], [5, ['ECDSA S: %s' % ' '.join(format(i[2], '02x') for i in s[32:64])]])
+                put(s[0][0], s[31][1], out_ann, [5, ['ECDSA R: %s' % hexdump(s[0:32])]])
+                put(s[32][0], s[63][1], out_ann, [5, ['ECDSA S: %s' % hexdump(s[32:64])]])
             if len(s) == 83: # OtherData (follow ECDSA components in validate / invalidate mode)
-                self.putz(s[64][0], s[82][1], [5, ['OtherData: %s' % ' '.join(format(i[2], '02x') for i in s[64:83])]])
+                put(s[64][0], s[82][1], out_ann, [5, ['OtherData: %s' % hexdump(s[64:83])]])
             if len(s) == 128: # Public key components (follow ECDSA components in external mode)
-                self.putz(s[64][0], s[95][1], [5, ['Pub X: %s' % ' '.join(format(i[2], '02x') for i in s[64:96])]])
-                self.putz(s[96][0], s[127][1], [5, ['Pub Y: %s' % ' '.join(format(i[2], '02x') for i in s[96:128])]])
+                put(s[64][0], s[95][1], out_ann, [5, ['Pub X: %s' % hexdump(s[64:96])]])
+                put(s[96][0], s[127][1], out_ann, [5, ['Pub Y: %s' % hexdump(s[96:128])]])
         elif op == OPCODE_WRITE:
             if len(s) > 32: # Value + MAC.
-                self.putz(s[0][0], s[-31][1], [5, ['Value: %s' % ' '.join(format(i[2], '02x') for i in s)]])
-                self.putz(s[-32][0], s[-1][1], [5, ['MAC: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+                text = hexdump(s)
+                put(s[0][0], s[-31][1], out_ann, [5, ['Value: %s' % text]])
+                put(s[-32][0], s[-1][1], out_ann, [5, ['MAC: %s' % text]])
             else: # Just value.
-                self.putz(s[0][0], s[-1][1], [5, ['Value: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+                put(s[0][0], s[-1][1], out_ann, [5, ['Value: %s' % hexdump(s)]])
         else:
-            self.putz(s[0][0], s[-1][1], [5, ['Data: %s' % ' '.join(format(i[2], '02x') for i in s)]])
+            put(s[0][0], s[-1][1], out_ann, [5, ['Data: %s' % hexdump(s)]])
 
     def put_crc(self, s):
-        self.puty(s, [6, ['CRC: {:02X} {:02X}'.format(s[0][2], s[1][2])]])
+        self.puty(s, [6, ['CRC: %s %s' % (HEX_BYTES_UPPER[s[0][2]], HEX_BYTES_UPPER[s[1][2]])]])
 
     def put_status(self, ss, es, status):
-        self.putz(ss, es, [7, ['Status: %s' % STATUS[status]]])
+        self.putz(ss, es, STATUS_ANNS[status])
 
     def put_warning(self, ss, es, msg):
         self.putz(ss, es, [8, ['Warning: %s' % msg]])
 
+    def handle_idle(self, ss, es, cmd, databyte):
+        # Wait for an I²C START condition.
+        if cmd != 'START':
+            return
+        self.state = STATE_GET_SLAVE_ADDR
+        self.ss_block = ss
+
+    def handle_get_slave_addr(self, ss, es, cmd, databyte):
+        # Wait for an address read/write operation.
+        if cmd == 'ADDRESS READ':
+            self.state = STATE_READ_REGS
+        elif cmd == 'ADDRESS WRITE':
+            self.state = STATE_WRITE_REGS
+
+    def handle_read_regs(self, ss, es, cmd, databyte):
+        if cmd == 'DATA READ':
+            self.bytes.append((ss, es, databyte))
+        elif cmd == 'STOP':
+            self.es_block = es
+            # Reset the opcode before received data, as this causes
+            # responses to be displayed incorrectly.
+            self.opcode = -1
+            if self.bytes:
+                self.output_rx_bytes()
+            self.waddr = -1
+            self.bytes.clear()
+            self.state = STATE_IDLE
+
+    def handle_write_regs(self, ss, es, cmd, databyte):
+        if cmd == 'DATA WRITE':
+            self.bytes.append((ss, es, databyte))
+        elif cmd == 'STOP':
+            self.es_block = es
+            self.output_tx_bytes()
+            self.bytes.clear()
+            self.state = STATE_IDLE
+
     def decode(self, ss, es, data):
         cmd, databyte = data
         # State machine.
-        if self.state == 'IDLE':
-            # Wait for an I²C START condition.
-            if cmd != 'START':
-                return
-            self.state = 'GET SLAVE ADDR'
-            self.ss_block = ss
-        elif self.state == 'GET SLAVE ADDR':
-            # Wait for an address read/write operation.
-            if cmd == 'ADDRESS READ':
-                self.state = 'READ REGS'
-            elif cmd == 'ADDRESS WRITE':
-                self.state = 'WRITE REGS'
-        elif self.state == 'READ REGS':
-            if cmd == 'DATA READ':
-                self.bytes.append([ss, es, databyte])
-            elif cmd == 'STOP':
-                self.es_block = es
-                # Reset the opcode before received data, as this causes
-                # responses to be displayed incorrectly.
-                self.opcode = -1
-                if len(self.bytes) > 0:
-                    self.output_rx_bytes()
-                self.waddr = -1
-                self.bytes = []
-                self.state = 'IDLE'
-        elif self.state == 'WRITE REGS':
-            if cmd == 'DATA WRITE':
-                self.bytes.append([ss, es, databyte])
-            elif cmd == 'STOP':
-                self.es_block = es
-                self.output_tx_bytes()
-                self.bytes = []
-                self.state = 'IDLE'
+        self.state_handlers[self.state](ss, es, cmd, databyte)